@@ -41,6 +41,9 @@ setup(name='sinergym',
           'visualization': [
               'matplotlib',
           ],
+          'performance': [
+              'numba',  # compiled observation normalization
+          ],
           'gcloud': [
               'google-api-python-client',
               'oauth2client',
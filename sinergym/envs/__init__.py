@@ -1,3 +1,4 @@
 """Sinergym simulation environments."""
 
 from .eplus_env import EplusEnv
+from .vec import make_vec
@@ -78,6 +78,17 @@ class EplusEnv(gym.Env):
         # parse variables (observation and action) from cfg file
         self.variables = parse_variables(self.variables_path)
 
+        # Observation indexes used every step (avoid dict building and
+        # string comparisons in the simulation loop)
+        self._zone_temp_idx = np.array(
+            [i for i, variable in enumerate(self.variables['observation'])
+             if variable.startswith('Zone Air Temperature')], dtype=np.intp)
+        # (None if variable is not observed, step will fail then)
+        self._power_idx = self._observation_index(
+            'Facility Total HVAC Electricity Demand Rate (Whole Building)')
+        self._outtemp_idx = self._observation_index(
+            'Site Outdoor Air Drybulb Temperature (Environment)')
+
         # Random noise to apply for weather series
         self.weather_variability = weather_variability
 
@@ -101,6 +112,11 @@ class EplusEnv(gym.Env):
         if self.flag_discrete:
             self.action_mapping = discrete_action_def
             self.action_space = gym.spaces.Discrete(len(discrete_action_def))
+            # Setpoints by action index, shape (n_actions, n_setpoints)
+            self._action_table = np.asarray(
+                [discrete_action_def[i]
+                 for i in range(len(discrete_action_def))],
+                dtype=np.float64)
         # Continuous
         else:
             # Defining action values setpoints (one per value)
@@ -135,24 +151,16 @@ class EplusEnv(gym.Env):
 
         # Get action depending on flag_discrete
         if self.flag_discrete:
-            # Index for action_mapping
-            if np.issubdtype(type(action), np.integer):
-                if isinstance(action, int):
-                    setpoints = self.action_mapping[action]
-                else:
-                    setpoints = self.action_mapping[np.asscalar(action)]
-            # Manual action
-            elif isinstance(action, tuple) or isinstance(action, list):
-                # stable-baselines DQN bug prevention
-                if len(action) == 1:
-                    setpoints = self.action_mapping[np.asscalar(action)]
-                else:
-                    setpoints = action
-            elif isinstance(action, np.ndarray):
-                setpoints = self.action_mapping[np.asscalar(action)]
+            # Manual action (setpoints given directly)
+            if isinstance(action, (tuple, list)) and len(action) > 1:
+                action_ = list(action)
+            # Index for action_mapping (stable-baselines may give it in a
+            # list or array with a single element)
+            elif isinstance(action, (int, np.integer)):
+                action_ = self._action_table[action].tolist()
             else:
-                print("ERROR: ", type(action))
-            action_ = list(setpoints)
+                index = np.asarray(action).item()
+                action_ = self._action_table[index].tolist()
         else:
             # transform action to setpoints simulation
             action_ = setpoints_transform(
@@ -161,20 +169,18 @@ class EplusEnv(gym.Env):
         # Send action to the simulator
         self.simulator.logger_main.debug(action_)
         time_info, obs, done = self.simulator.step(action_)
-        # Create dictionary with observation
-        obs_dict = dict(zip(self.variables['observation'], obs))
-        # Add current timestep information
-        obs_dict['day'] = time_info[0]
-        obs_dict['month'] = time_info[1]
-        obs_dict['hour'] = time_info[2]
+        obs_values = np.asarray(obs, dtype=np.float64)
 
         # Calculate reward
 
         # Calculate temperature mean for all building zones
-        temp_values = [value for key, value in obs_dict.items(
-        ) if key.startswith('Zone Air Temperature')]
+        temp_values = obs_values[self._zone_temp_idx].tolist()
 
-        power = obs_dict['Facility Total HVAC Electricity Demand Rate (Whole Building)']
+        if self._power_idx is None or self._outtemp_idx is None:
+            raise KeyError(
+                'Facility Total HVAC Electricity Demand Rate (Whole Building) and '
+                'Site Outdoor Air Drybulb Temperature (Environment) must be observation variables')
+        power = float(obs_values[self._power_idx])
         reward, terms = self.cls_reward.calculate(
             power, temp_values, time_info[1], time_info[0])
 
@@ -183,18 +189,31 @@ class EplusEnv(gym.Env):
             'timestep': int(
                 time_info[3] / self.simulator._eplus_run_stepsize),
             'time_elapsed': int(time_info[3]),
-            'day': obs_dict['day'],
-            'month': obs_dict['month'],
-            'hour': obs_dict['hour'],
+            'day': time_info[0],
+            'month': time_info[1],
+            'hour': time_info[2],
             'total_power': power,
             'total_power_no_units': terms['reward_energy'],
             'comfort_penalty': terms['reward_comfort'],
             'temperatures': temp_values,
-            'out_temperature': obs_dict['Site Outdoor Air Drybulb Temperature (Environment)'],
+            'out_temperature': float(obs_values[self._outtemp_idx]),
             'action_': action_}
 
-        return np.array(list(obs_dict.values()),
-                        dtype=np.float32), reward, done, info
+        return self._get_obs(obs_values, time_info), reward, done, info
+
+    def _observation_index(self, variable):
+        """Position of a variable in observation.
+
+        Args:
+            variable (str): Observation variable name.
+
+        Returns:
+            int: Variable index in observation (None if it is not an observation variable).
+        """
+        try:
+            return self.variables['observation'].index(variable)
+        except ValueError:
+            return None
 
     def reset(self):
         """Reset the environment.
@@ -204,13 +223,24 @@ class EplusEnv(gym.Env):
         """
         # Change to next episode
         time_info, obs, done = self.simulator.reset(self.weather_variability)
-        obs_dict = dict(zip(self.variables['observation'], obs))
 
-        obs_dict['day'] = time_info[0]
-        obs_dict['month'] = time_info[1]
-        obs_dict['hour'] = time_info[2]
+        return self._get_obs(obs, time_info)
+
+    def _get_obs(self, obs, time_info):
+        """Build agent observation: simulator values followed by day, month and hour.
+
+        Args:
+            obs (list or np.array): Values received from the simulator.
+            time_info (tuple): Day, month, hour and time elapsed in simulation.
 
-        return np.array(list(obs_dict.values()), dtype=np.float32)
+        Returns:
+            np.array: Observation with float32 dtype.
+        """
+        n_obs = len(obs)
+        obs_arr = np.empty(n_obs + 3, dtype=np.float32)
+        obs_arr[:n_obs] = obs
+        obs_arr[n_obs:] = time_info[:3]
+        return obs_arr
 
     def render(self, mode='human'):
         """Environment rendering."""
@@ -0,0 +1,40 @@
+"""Vectorized Sinergym environments (several EnergyPlus simulations running in parallel)."""
+
+import gym
+
+
+def make_vec(env_id, num_envs, weather_files=None, env_name=None):
+    """Create a Gym asynchronous vectorized environment with one EnergyPlus simulation per worker process.
+
+    Each worker uses its own environment name, so experiment working directories
+    of different workers never collide.
+
+    Args:
+        env_id (str): Registered Sinergym environment id (for example, Eplus-demo-v1).
+        num_envs (int): Number of environments (worker processes).
+        weather_files (list, optional): Weather file (.epw) name for each environment. Defaults to None (environment default weather).
+        env_name (str, optional): Base name of workers environment names. Defaults to None (registered environment name).
+
+    Returns:
+        gym.vector.AsyncVectorEnv: Vectorized environment.
+    """
+    if weather_files is not None and len(weather_files) != num_envs:
+        raise ValueError(
+            'weather_files must have one element per environment (%d), %d given' %
+            (num_envs, len(weather_files)))
+
+    if env_name is None:
+        spec = gym.spec(env_id)
+        # EnvSpec kwargs are private (_kwargs) in gym<=0.21
+        spec_kwargs = getattr(spec, 'kwargs', None)
+        if spec_kwargs is None:
+            spec_kwargs = spec._kwargs
+        env_name = spec_kwargs.get('env_name', 'eplus-env-v1')
+
+    def make_env(index):
+        kwargs = {'env_name': '%s-%d' % (env_name, index)}
+        if weather_files is not None:
+            kwargs['weather_file'] = weather_files[index]
+        return lambda: gym.make(env_id, **kwargs)
+
+    return gym.vector.AsyncVectorEnv([make_env(i) for i in range(num_envs)])
@@ -8,22 +8,28 @@ Class for connecting EnergyPlus with Python using Ptolomy server.
 
 import socket
 import os
-import time
 import signal
-import _thread
 import subprocess
 import threading
 import numpy as np
 
 from shutil import copyfile
+from functools import lru_cache, partial
 from xml.etree.ElementTree import Element, SubElement, Comment, tostring
 
 from sinergym.utils.common import *
 from sinergym.utils.config import Config
 
 LOG_LEVEL_MAIN = 'INFO'
-LOG_LEVEL_EPLS = 'ERROR'
 LOG_FMT = "[%(asctime)s] %(name)s %(levelname)s:%(message)s"
+# Maximum seconds waiting for EnergyPlus to finish after the last message
+EPLUS_END_TIMEOUT = 5.0
+# Maximum number of simulation time info values cached
+TIME_INFO_CACHE_SIZE = 65536
+# Seconds between checks of EnergyPlus process while waiting for connection
+EPLUS_ACCEPT_POLL = 1.0
+# Number of last eplus.stderr lines logged when EnergyPlus fails
+EPLUS_ERR_TAIL_LINES = 20
 
 
 class EnergyPlus(object):
@@ -62,6 +68,8 @@ class EnergyPlus(object):
         # Create a socket for communication with the EnergyPlus
         self.logger_main.debug('Creating socket for communication...')
         self._socket = socket.socket()
+        # Allow reusing the address while old connections are in TIME_WAIT
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         # Get local machine name
         self._host = socket.gethostname()
         # Bind to the host and any available port
@@ -122,6 +130,10 @@ class EnergyPlus(object):
         self._eplus_one_epi_len = self._config._get_one_epi_len()
         # Stepsize in seconds
         self._eplus_run_stepsize = 3600 / self._eplus_n_steps_per_hour
+        # Time info only depends on simulation seconds elapsed (multiple of
+        # stepsize), so it is computed once per value and cached
+        self._get_time_info = lru_cache(maxsize=TIME_INFO_CACHE_SIZE)(
+            partial(get_current_time_info, self._config.building))
 
     def reset(self, weather_variability: tuple = None):
         """Resets the environment.
@@ -131,7 +143,7 @@ class EnergyPlus(object):
 
         Returns:
             ([float], [float], boolean): The first element is a float tuple with day, month, hour and simulation time elapsed in that order in that step;
-            the second element consist on EnergyPlus results in a 1-D list correponding to the variables in
+            the second element consist on EnergyPlus results in a 1-D np.array correponding to the variables in
             variables.cfg. The last element is a boolean indicating whether the episode terminates.
 
         This method does the following:
@@ -185,28 +197,28 @@ class EnergyPlus(object):
             self._get_is_subprocess_running(eplus_process))
         self._eplus_process = eplus_process
 
-        # Log EnergyPlus output
-        eplus_logger = Logger().getLogger('EPLUS_ENV_%s_%s-EPLUSPROCESS_EPI_%d' %
-                                          (self._env_name, self._thread_name, self._epi_num), LOG_LEVEL_EPLS, LOG_FMT)
-        _thread.start_new_thread(self._log_subprocess_info,
-                                 (eplus_process.stdout,
-                                  eplus_logger))
-        _thread.start_new_thread(self._log_subprocess_err,
-                                 (eplus_process.stderr,
-                                  eplus_logger))
-
         # Establish connection with EnergyPlus
         # Establish connection with client
-        conn, addr = self._socket.accept()
+        conn, addr = self._accept_eplus(eplus_process, eplus_working_dir)
         self.logger_main.debug('Got connection from %s at port %d.' % (addr))
+        # Messages are small and latency bound, do not wait to coalesce them
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Buffered file objects over the connection, BCVTB messages end with
+        # a newline so a whole message is read regardless of its size
+        self._rfile = conn.makefile('rb', buffering=65536)
+        self._wfile = conn.makefile('wb')
         # Start the first data exchange
-        rcv_1st = conn.recv(2048).decode(encoding='ISO-8859-1')
+        rcv_1st = self._rfile.readline().decode(encoding='ISO-8859-1')
+        if not rcv_1st:
+            self._log_eplus_error(eplus_working_dir)
+            raise RuntimeError(
+                'EnergyPlus closed the connection before starting simulation')
         self.logger_main.debug(
-            'Got the first message successfully: ' + rcv_1st)
+            'Got the first message successfully: %s', rcv_1st)
         version, flag, nDb, nIn, nBl, curSimTim, Dblist \
             = self._disassembleMsg(rcv_1st)
         # get time info in simulation
-        time_info = get_current_time_info(self._config.building, curSimTim)
+        time_info = self._get_time_info(curSimTim)
         ret.append(time_info)
         ret.append(Dblist)
         # Remember the message header, useful when send data back to EnergyPlus
@@ -235,7 +247,7 @@ class EnergyPlus(object):
 
         Returns:
             ([float], [float], boolean): The first element is a float tuple with day, month, hour and simulation time elapsed in that order in that step;
-            the second element consist on EnergyPlus results in a 1-D list correponding to the variables in
+            the second element consist on EnergyPlus results in a 1-D np.array correponding to the variables in
             variables.cfg. The last element is a boolean indicating whether the episode terminates.
 
         This method does the following:
@@ -259,10 +271,15 @@ class EnergyPlus(object):
             runFlag = 0  # 0 is normal flag
             tosend = self._assembleMsg(header[0], runFlag, len(action), 0,
                                        0, curSimTim, action)
-            self._conn.send(tosend.encode())
+            self._wfile.write(tosend)
+            self._wfile.flush()
             # Recieve from EnergyPlus
-            rcv = self._conn.recv(2048).decode(encoding='ISO-8859-1')
-            self.logger_main.debug('Got message successfully: ' + rcv)
+            rcv = self._rfile.readline().decode(encoding='ISO-8859-1')
+            if not rcv:
+                self._log_eplus_error(self._eplus_working_dir)
+                raise RuntimeError(
+                    'EnergyPlus closed the connection during simulation')
+            self.logger_main.debug('Got message successfully: %s', rcv)
             # Process received msg
             version, flag, nDb, nIn, nBl, curSimTim, Dblist \
                 = self._disassembleMsg(rcv)
@@ -274,7 +291,7 @@ class EnergyPlus(object):
         # Construct the return, which is the state observation of the last step
         # plus the integral item
         # get time info in simulation
-        time_info = get_current_time_info(self._config.building, curSimTim)
+        time_info = self._get_time_info(curSimTim)
         ret.append(time_info)
         ret.append(Dblist)
         # Add terminal state
@@ -300,20 +317,64 @@ class EnergyPlus(object):
             subprocess.Popen: EnergyPlus process.
         """
 
-        eplus_process = subprocess.Popen(
-            '%s -w %s -d %s %s' %
-            (eplus_path +
-             '/energyplus',
-             weather_path,
-             out_path,
-             idf_path),
-            shell=True,
-            cwd=eplus_working_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            preexec_fn=os.setsid)
+        # EnergyPlus output is written directly in working dir files (no
+        # Python threads reading pipes during the simulation)
+        with open(eplus_working_dir + '/eplus.stdout', 'wb') as stdout_file, \
+                open(eplus_working_dir + '/eplus.stderr', 'wb') as stderr_file:
+            # No intermediate shell; start_new_session keeps EnergyPlus in its
+            # own process group (killed with os.killpg) without preexec_fn
+            eplus_process = subprocess.Popen(
+                [eplus_path + '/energyplus',
+                 '-w', weather_path,
+                 '-d', out_path,
+                 idf_path],
+                cwd=eplus_working_dir,
+                stdout=stdout_file,
+                stderr=stderr_file,
+                start_new_session=True)
         return eplus_process
 
+    def _accept_eplus(self, eplus_process, eplus_working_dir):
+        """Wait for EnergyPlus connection, checking that its process has not finished before connecting.
+
+        Args:
+            eplus_process (subprocess.Popen): EnergyPlus process.
+            eplus_working_dir (str): EnergyPlus working directory.
+
+        Returns:
+            (socket.socket, tuple): Connection with EnergyPlus and its address.
+        """
+        self._socket.settimeout(EPLUS_ACCEPT_POLL)
+        try:
+            while True:
+                try:
+                    return self._socket.accept()
+                except socket.timeout:
+                    if eplus_process.poll() is not None:
+                        self._log_eplus_error(eplus_working_dir)
+                        raise RuntimeError(
+                            'EnergyPlus process finished (return code %d) before connecting' %
+                            eplus_process.returncode)
+        finally:
+            self._socket.settimeout(None)
+
+    def _log_eplus_error(self, eplus_working_dir):
+        """Log EnergyPlus standard error (last lines) when simulation fails.
+
+        Args:
+            eplus_working_dir (str): EnergyPlus working directory.
+        """
+        stderr_path = eplus_working_dir + '/eplus.stderr'
+        try:
+            with open(stderr_path, 'rb') as stderr_file:
+                lines = stderr_file.read().decode(
+                    errors='replace').splitlines()[-EPLUS_ERR_TAIL_LINES:]
+        except OSError:
+            lines = []
+        self.logger_main.error(
+            'EnergyPlus failed, see %s and %s/output/eplusout.err. Last EnergyPlus errors:\n%s',
+            stderr_path, eplus_working_dir, '\n'.join(lines))
+
     def _create_socket_cfg(self, host, port, write_dir):
         """Creates the socket required by BCVTB
 
@@ -336,14 +397,6 @@ class EnergyPlus(object):
         path_list = file_path.split('/')
         return path_list[-1]
 
-    def _log_subprocess_info(self, out, logger):
-        for line in iter(out.readline, b''):
-            logger.info(line.decode())
-
-    def _log_subprocess_err(self, out, logger):
-        for line in iter(out.readline, b''):
-            logger.error(line.decode())
-
     def _get_is_subprocess_running(self, subprocess):
         if subprocess.poll() is None:
             return True
@@ -377,35 +430,61 @@ class EnergyPlus(object):
         tosend = self._assembleMsg(header[0], flag, action_size, 0,
                                    0, self._curSimTim, action)
         self.logger_main.debug('Send final msg to Eplus.')
-        self._conn.send(tosend.encode())
+        self._wfile.write(tosend)
+        self._wfile.flush()
         # Recieve the final msg from Eplus
-        rcv = self._conn.recv(2048).decode(encoding='ISO-8859-1')
+        rcv = self._rfile.readline().decode(encoding='ISO-8859-1')
         self.logger_main.debug('Final msg from Eplus: %s', rcv)
-        self._conn.send(tosend.encode())  # Send again, don't know why
-        # Remove the connection
+        # EnergyPlus finishes with the terminate flag, the final message was
+        # sent twice in original Gym-Eplus project (kept available for
+        # compatibility with old EnergyPlus versions)
+        if os.environ.get('BCVTB_LEGACY_DOUBLE_SEND') == '1':
+            self._wfile.write(tosend)
+            self._wfile.flush()
+        # Remove the connection (file objects hold a reference to the socket)
+        self._rfile.close()
+        self._wfile.close()
+        self._rfile = None
+        self._wfile = None
+        # Close our side first and wait for EnergyPlus to close its side, so
+        # the connection does not remain half-open
+        try:
+            self._conn.shutdown(socket.SHUT_WR)
+            self._conn.settimeout(EPLUS_END_TIMEOUT)
+            while self._conn.recv(4096):
+                pass
+        except OSError:
+            pass
         self._conn.close()
         self._conn = None
         # Process the output
-        # Sleep the thread so EnergyPlus has time to do the post processing
-        time.sleep(1)
-
-        # Kill subprocess
-        os.killpg(self._eplus_process.pid, signal.SIGTERM)
+        # Wait for EnergyPlus to do the post processing and exit (it usually
+        # finishes as soon as connection is closed)
+        try:
+            self._eplus_process.wait(timeout=EPLUS_END_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.logger_main.debug(
+                'EnergyPlus process has not finished after %.1f seconds.' %
+                EPLUS_END_TIMEOUT)
+
+        # Kill subprocess (if it is still alive)
+        try:
+            os.killpg(self._eplus_process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
         self._episode_existed = False
 
     def _run_eplus_outputProcessing(self):
         eplus_outputProcessing_process =\
-            subprocess.Popen('%s'
-                             % (self._eplus_path + '/PostProcess/ReadVarsESO'),
-                             shell=True,
+            subprocess.Popen([self._eplus_path + '/PostProcess/ReadVarsESO'],
                              cwd=self._eplus_working_dir + '/output',
                              stdout=subprocess.PIPE,
                              stderr=subprocess.PIPE,
-                             preexec_fn=os.setsid)
+                             start_new_session=True)
 
     def _assembleMsg(self, version, flag, nDb, nIn, nBl, curSimTim, Dblist):
         """Assembles the sent message to EnergyPlus based on the protocol.
-        The message must be a blank space separated string set with the fields defined as arguments.
+        The message must be a blank space separated bytes string set with the fields defined as arguments.
 
         Args:
             version (str): EnergyPlus version.
@@ -417,39 +496,33 @@ class EnergyPlus(object):
             Dblist (str): --
 
         Returns:
-            str: --
+            bytes: Message ready to be sent (ASCII encoded).
         """
 
-        ret = ''
-        ret += '%d' % (version)
-        ret += ' '
-        ret += '%d' % (flag)
-        ret += ' '
-        ret += '%d' % (nDb)
-        ret += ' '
-        ret += '%d' % (nIn)
-        ret += ' '
-        ret += '%d' % (nBl)
-        ret += ' '
-        ret += '%20.15e' % (curSimTim)
-        ret += ' '
-        for i in range(len(Dblist)):
-            ret += '%20.15e' % (Dblist[i])
-            ret += ' '
-        ret += '\n'
-        return ret
+        # Single format call instead of per-element string concatenation,
+        # message is built as bytes directly (no encoding before sending)
+        msg_fmt = b'%d %d %d %d %d' + b' %20.15e' * (len(Dblist) + 1) + b' \n'
+        return msg_fmt % (version, flag, nDb, nIn, nBl, curSimTim, *Dblist)
 
     def _disassembleMsg(self, rcv):
-        rcv = rcv.split(' ')
-        version = int(rcv[0])
-        flag = int(rcv[1])
-        nDb = int(rcv[2])
-        nIn = int(rcv[3])
-        nBl = int(rcv[4])
-        curSimTim = float(rcv[5])
-        Dblist = []
-        for i in range(6, len(rcv) - 1):
-            Dblist.append(float(rcv[i]))
+        """Disassembles the received message from EnergyPlus based on the protocol.
+
+        Args:
+            rcv (str): Blank space separated message received from EnergyPlus.
+
+        Returns:
+            (int, int, int, int, int, float, np.array): version, flag, nDb, nIn, nBl, current simulation time and values array (float64).
+        """
+        # Parse the whole message in C instead of one float() call per value
+        values = np.fromstring(rcv.rstrip(), dtype=np.float64, sep=' ')
+        version = int(values[0])
+        flag = int(values[1])
+        nDb = int(values[2])
+        nIn = int(values[3])
+        nBl = int(values[4])
+        curSimTim = float(values[5])
+        # Values are returned as array, ready to be gathered by index
+        Dblist = values[6:]
 
         return (version, flag, nDb, nIn, nBl, curSimTim, Dblist)
 
@@ -1,7 +1,11 @@
 """Common utilities."""
 
 import os
+import atexit
 import logging
+import queue
+import threading
+import weakref
 import numpy as np
 import xml.etree.ElementTree as ET
 from pydoc import locate
@@ -257,6 +261,44 @@ def parse_observation_action_space(space_file):
     return result
 
 
+def ornstein_uhlenbeck_process(n, sigma, mu, tau):
+    """Generate a noise series of n values using Ornstein-Uhlenbeck process (total time is 1).
+
+    Args:
+        n (int): Number of values in the series.
+        sigma (float): Standard deviation.
+        mu (float): Mean.
+        tau (float): Time constant.
+
+    Returns:
+        np.array: Noise series (first value is always 0).
+
+    """
+
+    dt = 1. / n
+    sigma_bis = sigma * np.sqrt(2. / tau)
+    sqrtdt = np.sqrt(dt)
+
+    # x[i + 1] = (1 - dt / tau) * x[i] + increments[i]
+    alpha = dt / tau
+    increments = dt * mu / tau + \
+        sigma_bis * sqrtdt * np.random.randn(n - 1)
+
+    if 0 < alpha <= 1:
+        # Same recurrence than an exponentially weighted mean
+        # (y[i] = (1 - alpha) * y[i - 1] + alpha * u[i]), computed by pandas
+        # without a Python loop
+        u = np.zeros(n)
+        u[1:] = increments / alpha
+        x = pd.Series(u).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    else:
+        x = np.zeros(n)
+        for i in range(n - 1):
+            x[i + 1] = (1 - alpha) * x[i] + increments[i]
+
+    return x
+
+
 def create_variable_weather(
         weather_data,
         original_epw_file,
@@ -285,22 +327,12 @@ def create_variable_weather(
         mu = variation[1]  # Mean.
         tau = variation[2]  # Time constant.
 
-        T = 1.  # Total time.
         # All the columns are going to have the same num of rows since they are
         # in the same dataframe
         n = len(df[columns[0]])
-        dt = T / n
-        # t = np.linspace(0., T, n)  # Vector of times.
-
-        sigma_bis = sigma * np.sqrt(2. / tau)
-        sqrtdt = np.sqrt(dt)
-
-        x = np.zeros(n)
 
         # Create noise
-        for i in range(n - 1):
-            x[i + 1] = x[i] + dt * (-(x[i] - mu) / tau) + \
-                sigma_bis * sqrtdt * np.random.randn()
+        x = ornstein_uhlenbeck_process(n, sigma, mu, tau)
 
         for column in columns:
             # Add noise
@@ -451,6 +483,51 @@ class Logger():
         return logger
 
 
+def _empty_none_fields(row_contents):
+    """Replace None fields of a CSV row (they are written as empty fields).
+
+    Args:
+        row_contents (list): Row fields.
+
+    Returns:
+        list: Row fields without None values.
+    """
+    return ['' if value is None else value for value in row_contents]
+
+
+def _mean(total, count):
+    """Mean value from a running sum (nan if there are no values, like np.mean).
+
+    Args:
+        total (float): Sum of values.
+        count (int): Number of values.
+
+    Returns:
+        float: Mean value.
+    """
+    return total / count if count else np.nan
+
+
+# CSV loggers with a writer thread running (closed at exit to write
+# pending rows)
+_OPENED_CSV_LOGGERS = weakref.WeakSet()
+
+
+@atexit.register
+def _close_csv_loggers():
+    """Close CSV loggers which are still writing monitor files.
+    """
+    errors = []
+    for logger in list(_OPENED_CSV_LOGGERS):
+        try:
+            logger.close()
+        except Exception as error:
+            # Close the rest of loggers before reporting it
+            errors.append(error)
+    if errors:
+        raise errors[0]
+
+
 class CSVLogger(object):
     """CSV Logger for agent interaction with environment.
 
@@ -459,14 +536,18 @@ class CSVLogger(object):
         :param log_file: log_file path for monitor.csv, there will be one CSV per episode.
         :param log_progress_file: log_file path for progress.csv, there will be only one CSV per whole simulation.
         :param flag: This flag is used to activate (True) or deactivate (False) Logger in real time.
-        :param steps_data, rewards, powers, etc: These arrays are used to record steps data to elaborate main data for progress.csv later.
+        :param cumulative_reward, cumulative_power, etc: Running sums (and their number of values) of steps data to elaborate main data for progress.csv later.
         :param total_timesteps: Current episode timesteps executed.
         :param total_time_elapsed: Current episode time elapsed (simulation seconds).
         :param comfort_violation_timesteps: Current episode timesteps whose comfort_penalty!=0.
-        :param steps_data: It is a array of str's. Each element belong to a step data.
 
     """
 
+    #: Buffer size (bytes) for monitor files.
+    BUFFER_SIZE = 1 << 20
+    #: Maximum number of rows waiting to be written by the writer thread.
+    QUEUE_SIZE = 1024
+
     def __init__(
             self,
             monitor_header,
@@ -476,18 +557,34 @@ class CSVLogger(object):
             flag=True):
 
         self.monitor_header = monitor_header
+        # Format string for a whole monitor row (one field per header column)
+        self._row_fmt = ','.join(
+            ['%s'] * len(monitor_header.split(','))) + '\n'
         self.progress_header = progress_header + '\n'
         self.log_file = log_file
         self.log_progress_file = log_progress_file
         self.flag = flag
 
+        # monitor files (opened in set_log_file) and the background thread
+        # which formats and writes their rows (one thread for all episodes)
+        self._monitor_file = None
+        self._normalized_file = None
+        self._rows_queue = None
+        self._writer = None
+        self._writer_finalizer = None
+        # exceptions raised in writer thread (raised again in main thread)
+        self._writer_errors = []
+        self._start_writer()
+
         # episode data
-        self.steps_data = [self.monitor_header.split(',')]
-        self.steps_data_normalized = [self.monitor_header.split(',')]
-        self.rewards = []
-        self.powers = []
-        self.comfort_penalties = []
-        self.power_penalties = []
+        self.cumulative_reward = 0.0
+        self.cumulative_power = 0.0
+        self.cumulative_comfort_penalty = 0.0
+        self.cumulative_power_penalty = 0.0
+        self.num_rewards = 0
+        self.num_powers = 0
+        self.num_comfort_penalties = 0
+        self.num_power_penalties = 0
         self.total_timesteps = 0
         self.total_time_elapsed = 0
         self.comfort_violation_timesteps = 0
@@ -504,11 +601,11 @@ class CSVLogger(object):
             comfort_penalty,
             power,
             done):
-        """Log step information and store it in steps_data param.
+        """Log step information and write it in monitor.csv.
 
         Args:
             timestep (int): Current episode timestep in simulation.
-            date (list): Current date [month,day,hour] in simulation.
+            date (list or tuple): Current date [month,day,hour] in simulation.
             observation (list): Values that belong to current observation.
             action (list): Values that belong to current action.
             simulation_time (float): Total time elapsed in current episode (seconds).
@@ -520,10 +617,11 @@ class CSVLogger(object):
 
         """
         if self.flag:
-            row_contents = [timestep] + list(date) + list(observation) + \
-                list(action) + [simulation_time, reward,
-                                total_power_no_units, comfort_penalty, done]
-            self.steps_data.append(row_contents)
+            if self._monitor_file is not None:
+                self._raise_writer_error()
+                self._rows_queue.put(((self._monitor_file, self._row(
+                    timestep, date, observation, action, simulation_time,
+                    reward, total_power_no_units, comfort_penalty, done)),))
 
             # Store step information for episode
             self._store_step_information(
@@ -547,16 +645,63 @@ class CSVLogger(object):
             total_power_no_units,
             comfort_penalty,
             done):
+        """Log step information with normalized observation and write it in monitor_normalized.csv. Arguments are the same as log_step (observation normalized and without power).
+        """
+        if self.flag:
+            if self._monitor_file is not None:
+                self._raise_writer_error()
+                self._rows_queue.put(((self._get_normalized_file(), self._row(
+                    timestep, date, observation, action, simulation_time,
+                    reward, total_power_no_units, comfort_penalty, done)),))
+        else:
+            pass
+
+    def log_step_pair(
+            self,
+            timestep,
+            date,
+            observation,
+            normalized_observation,
+            action,
+            simulation_time,
+            reward,
+            total_power_no_units,
+            comfort_penalty,
+            power,
+            done):
+        """Log step information in monitor.csv and monitor_normalized.csv at once (same as log_step_normalize followed by log_step). Arguments are the same as log_step, plus:
+
+        Args:
+            normalized_observation (list): Values that belong to current observation (normalized).
+
+        """
         if self.flag:
-            row_contents = [timestep] + list(date) + list(observation) + \
-                list(action) + [simulation_time, reward,
-                                total_power_no_units, comfort_penalty, done]
-            self.steps_data_normalized.append(row_contents)
+            if self._monitor_file is not None:
+                self._raise_writer_error()
+                # Both rows are sent to writer thread in a single item
+                self._rows_queue.put((
+                    (self._get_normalized_file(), self._row(
+                        timestep, date, normalized_observation, action,
+                        simulation_time, reward, total_power_no_units,
+                        comfort_penalty, done)),
+                    (self._monitor_file, self._row(
+                        timestep, date, observation, action,
+                        simulation_time, reward, total_power_no_units,
+                        comfort_penalty, done))))
+
+            # Store step information for episode
+            self._store_step_information(
+                reward,
+                power,
+                comfort_penalty,
+                total_power_no_units,
+                timestep,
+                simulation_time)
         else:
             pass
 
     def log_episode(self, episode):
-        """Log episode main information using steps_data param.
+        """Log episode main information using steps data stored.
 
         Args:
             episode (int): Current simulation episode number.
@@ -564,14 +709,16 @@ class CSVLogger(object):
         """
         if self.flag:
             # statistics metrics for whole episode
-            ep_mean_reward = np.mean(self.rewards)
-            ep_cumulative_reward = np.sum(self.rewards)
-            ep_cumulative_power = np.sum(self.powers)
-            ep_mean_power = np.mean(self.powers)
-            ep_cumulative_comfort_penalty = np.sum(self.comfort_penalties)
-            ep_mean_comfort_penalty = np.mean(self.comfort_penalties)
-            ep_cumulative_power_penalty = np.sum(self.power_penalties)
-            ep_mean_power_penalty = np.mean(self.power_penalties)
+            ep_mean_reward = _mean(self.cumulative_reward, self.num_rewards)
+            ep_cumulative_reward = self.cumulative_reward
+            ep_cumulative_power = self.cumulative_power
+            ep_mean_power = _mean(self.cumulative_power, self.num_powers)
+            ep_cumulative_comfort_penalty = self.cumulative_comfort_penalty
+            ep_mean_comfort_penalty = _mean(
+                self.cumulative_comfort_penalty, self.num_comfort_penalties)
+            ep_cumulative_power_penalty = self.cumulative_power_penalty
+            ep_mean_power_penalty = _mean(
+                self.cumulative_power_penalty, self.num_power_penalties)
             try:
                 comfort_violation = (
                     self.comfort_violation_timesteps /
@@ -580,20 +727,9 @@ class CSVLogger(object):
             except ZeroDivisionError:
                 comfort_violation = np.nan
 
-            # write steps_info in monitor.csv
-            with open(self.log_file, 'w', newline='') as file_obj:
-                # Create a writer object from csv module
-                csv_writer = csv.writer(file_obj)
-                # Add contents of list as last row in the csv file
-                csv_writer.writerows(self.steps_data)
-
-            # Write normalize steps_info in monitor_normalized.csv
-            if len(self.steps_data_normalized) > 1:
-                with open(self.log_file[:-4] + '_normalized.csv', 'w', newline='') as file_obj:
-                    # Create a writer object from csv module
-                    csv_writer = csv.writer(file_obj)
-                    # Add contents of list as last row in the csv file
-                    csv_writer.writerows(self.steps_data_normalized)
+            # write pending steps in monitor.csv (and
+            # monitor_normalized.csv)
+            self._close_monitor_files()
 
             # Create CSV file with header if it's required for progress.csv
             if not os.path.isfile(self.log_progress_file):
@@ -632,14 +768,176 @@ class CSVLogger(object):
             new_log_file (str): New log path depending on simulation.
 
         """
+        # Last episode monitor files must not remain opened
+        self._close_monitor_files()
         if self.flag:
             self.log_file = new_log_file
             if self.log_file:
-                with open(self.log_file, 'a', newline='\n') as file_obj:
-                    file_obj.write(self.monitor_header)
+                # Writer thread is stopped if logger was closed before
+                if self._writer is None:
+                    self._start_writer()
+                self._monitor_file = self._open_monitor_file(self.log_file)
         else:
             pass
 
+    def flush(self):
+        """Wait for pending rows to be written and flush monitor files buffers.
+
+        Raises:
+            Exception: Error raised writing rows in writer thread.
+        """
+        if self._writer is not None:
+            self._rows_queue.join()
+        self._raise_writer_error()
+        if self._monitor_file is not None:
+            self._monitor_file.flush()
+        if self._normalized_file is not None:
+            self._normalized_file.flush()
+
+    def close(self):
+        """Write pending rows, close monitor files and stop writer thread.
+
+        Raises:
+            Exception: Error raised writing rows in writer thread.
+        """
+        try:
+            self._close_monitor_files()
+        finally:
+            if self._writer is not None:
+                self._writer_finalizer.detach()
+                self._rows_queue.put(None)
+                self._writer.join()
+                self._writer = None
+                self._writer_finalizer = None
+                self._rows_queue = None
+                _OPENED_CSV_LOGGERS.discard(self)
+
+    def _close_monitor_files(self):
+        """Write pending rows and close current episode monitor files.
+
+        Raises:
+            Exception: Error raised writing rows in writer thread.
+        """
+        if self._writer is not None:
+            self._rows_queue.join()
+        monitor_file, self._monitor_file = self._monitor_file, None
+        normalized_file, self._normalized_file = self._normalized_file, None
+        try:
+            if monitor_file is not None:
+                monitor_file.close()
+        finally:
+            if normalized_file is not None:
+                normalized_file.close()
+        self._raise_writer_error()
+
+    def _row(
+            self,
+            timestep,
+            date,
+            observation,
+            action,
+            simulation_time,
+            reward,
+            total_power_no_units,
+            comfort_penalty,
+            done):
+        """Build a monitor row with step information (arguments are the same as log_step).
+
+        Returns:
+            list: Row contents in monitor header order.
+        """
+        row_contents = [timestep] + list(date) + list(observation) + \
+            list(action) + [simulation_time, reward,
+                            total_power_no_units, comfort_penalty, done]
+        # Initial state of an episode has no action, reward, etc.
+        if reward is None:
+            row_contents = _empty_none_fields(row_contents)
+        return row_contents
+
+    def _get_normalized_file(self):
+        """Get monitor_normalized.csv file, it is only created if it is required.
+
+        Returns:
+            file object: Normalized monitor file opened for writing.
+        """
+        if self._normalized_file is None:
+            self._normalized_file = self._open_monitor_file(
+                self.log_file[:-4] + '_normalized.csv')
+        return self._normalized_file
+
+    def _open_monitor_file(self, path):
+        """Open a monitor file with a large write buffer and write its header.
+
+        Args:
+            path (str): Monitor file path.
+
+        Returns:
+            file object: Monitor file opened for writing (binary mode, rows are encoded by writer thread).
+        """
+        monitor_file = open(path, 'wb', buffering=self.BUFFER_SIZE)
+        monitor_file.write((self.monitor_header + '\n').encode())
+        return monitor_file
+
+    def _start_writer(self):
+        """Start the thread which formats and writes monitor rows in background.
+        """
+        self._rows_queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._writer = threading.Thread(
+            target=self._writer_loop,
+            args=(self._rows_queue, self._row_fmt, self._writer_errors),
+            daemon=True)
+        self._writer.start()
+        # Thread does not reference logger, stop it if logger is garbage
+        # collected without close (at exit, _close_csv_loggers closes it)
+        self._writer_finalizer = weakref.finalize(
+            self, self._rows_queue.put, None)
+        self._writer_finalizer.atexit = False
+        _OPENED_CSV_LOGGERS.add(self)
+
+    def _raise_writer_error(self):
+        """Raise in caller thread the first error of writer thread (if any).
+        """
+        if self._writer_errors:
+            error = self._writer_errors[0]
+            del self._writer_errors[:]
+            raise error
+
+    @staticmethod
+    def _writer_loop(rows_queue, row_fmt, errors):
+        """Format and write rows received until None is received.
+
+        If writing a file fails, the error is appended to errors and next rows
+        of that file are discarded (queue is still consumed, so main thread
+        never blocks).
+
+        Args:
+            rows_queue (queue.Queue): Queue with tuples of (monitor file, row contents) elements.
+            row_fmt (str): Format string for a whole row.
+            errors (list): List where writing errors are appended.
+        """
+        failed_files = set()
+        while True:
+            item = rows_queue.get()
+            try:
+                if item is None:
+                    return
+                for monitor_file, row_contents in item:
+                    if monitor_file in failed_files:
+                        continue
+                    try:
+                        # Row length must match monitor header (TypeError
+                        # otherwise, raised again in main thread)
+                        line = row_fmt % tuple(row_contents)
+                        monitor_file.write(line.encode())
+                        # Episode has finished (done), write it to disk
+                        if row_contents[-1]:
+                            monitor_file.flush()
+                    except Exception as error:
+                        failed_files.add(monitor_file)
+                        errors.append(error)
+            finally:
+                rows_queue.task_done()
+
     def _store_step_information(
             self,
             reward,
@@ -660,13 +958,17 @@ class CSVLogger(object):
 
         """
         if reward is not None:
-            self.rewards.append(reward)
+            self.cumulative_reward += reward
+            self.num_rewards += 1
         if power is not None:
-            self.powers.append(power)
+            self.cumulative_power += power
+            self.num_powers += 1
         if comfort_penalty is not None:
-            self.comfort_penalties.append(comfort_penalty)
+            self.cumulative_comfort_penalty += comfort_penalty
+            self.num_comfort_penalties += 1
         if power_penalty is not None:
-            self.power_penalties.append(power_penalty)
+            self.cumulative_power_penalty += power_penalty
+            self.num_power_penalties += 1
         if comfort_penalty != 0:
             self.comfort_violation_timesteps += 1
         self.total_timesteps = timestep
@@ -675,12 +977,14 @@ class CSVLogger(object):
     def _reset_logger(self):
         """Reset relevant data to next episode summary in progress.csv.
         """
-        self.steps_data = [self.monitor_header.split(',')]
-        self.steps_data_normalized = [self.monitor_header.split(',')]
-        self.rewards = []
-        self.powers = []
-        self. comfort_penalties = []
-        self.power_penalties = []
+        self.cumulative_reward = 0.0
+        self.cumulative_power = 0.0
+        self.cumulative_comfort_penalty = 0.0
+        self.cumulative_power_penalty = 0.0
+        self.num_rewards = 0
+        self.num_powers = 0
+        self.num_comfort_penalties = 0
+        self.num_power_penalties = 0
         self.total_timesteps = 0
         self.total_time_elapsed = 0
         self.comfort_violation_timesteps = 0
@@ -1,10 +1,10 @@
 """Class and utilities for set up extra configuration in experiments with Sinergym (extra params, weather_variability, building model modification and files management)"""
 from copy import deepcopy
+from functools import lru_cache
 import os
 from opyplus import Epm, WeatherData, Idd
-from sinergym.utils.common import prepare_batch_from_records, get_delta_seconds
-from shutil import rmtree
-import numpy as np
+from sinergym.utils.common import prepare_batch_from_records, get_delta_seconds, ornstein_uhlenbeck_process
+from shutil import rmtree, copyfile
 
 WEEKDAY_ENCODING = {'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
                     'friday': 4, 'saturday': 5, 'sunday': 6}
@@ -13,6 +13,53 @@ YEAR = 1991  # Non leap year
 CWD = os.getcwd()
 
 
+# ---------------------------------------------------------------------------- #
+#       Parsed files cache (shared by every Config with the same inputs)       #
+# ---------------------------------------------------------------------------- #
+
+@lru_cache(maxsize=4)
+def _load_idd(idd_path, mtime):
+    """Parse an IDD file once per path and modification time.
+
+    Args:
+        idd_path (str): IDD file path.
+        mtime (float): IDD file modification time (cache key).
+
+    Returns:
+        opyplus.Idd: IDD object.
+    """
+    return Idd(idd_path)
+
+
+@lru_cache(maxsize=16)
+def _load_read_only_epm(idf_path, mtime, idd):
+    """Parse an IDF (or DDY) file once per path, modification time and IDD. Returned model is shared, so it must not be modified.
+
+    Args:
+        idf_path (str): IDF file path.
+        mtime (float): IDF file modification time (cache key).
+        idd (opyplus.Idd): IDD object used to parse the file.
+
+    Returns:
+        opyplus.Epm: Model object.
+    """
+    return Epm.from_idf(idf_path, idd_or_version=idd, check_length=False)
+
+
+@lru_cache(maxsize=16)
+def _load_weather_data(epw_path, mtime):
+    """Parse an EPW file once per path and modification time. Returned weather data is shared, so it must not be modified.
+
+    Args:
+        epw_path (str): EPW file path.
+        mtime (float): EPW file modification time (cache key).
+
+    Returns:
+        opyplus.WeatherData: Weather data object.
+    """
+    return WeatherData.from_epw(epw_path)
+
+
 class Config(object):
     """Config object to manage extra configuration in Sinergym experiments.
 
@@ -24,9 +71,10 @@ class Config(object):
         :param extra_config: Number of episodes directories will be stored in experiment_path
         :param config: Dict config with extra configuration which is required to modify IDF model (may be None)
         :param _idd: IDD opyplus object to set up Epm
-        :param building: opyplus Epm object with IDF model
-        :param ddy_model: opyplus Epm object with DDY model
-        :param weather_data: opyplus WeatherData object with EPW data
+        :param building: opyplus Epm object with IDF model (accessing it from outside disables reuse of last IDF saved, since it may be modified)
+        :param ddy_model: opyplus Epm object with DDY model (shared, read only)
+        :param weather_data: opyplus WeatherData object with EPW data (shared, read only)
+        :param _building_model_path: Last IDF saved from building model (None if building model has been modified since then)
     """
 
     def __init__(
@@ -48,21 +96,44 @@ class Config(object):
         self.config = extra_config
 
         # Opyplus objects
-        self._idd = Idd(os.path.join(os.environ['EPLUS_PATH'], 'Energy+.idd'))
-        self.building = Epm.from_idf(
+        idd_path = os.path.join(os.environ['EPLUS_PATH'], 'Energy+.idd')
+        self._idd = _load_idd(idd_path, os.path.getmtime(idd_path))
+        # Building model is modified by each Config, so it is parsed again
+        self._building = Epm.from_idf(
             self._idf_path,
             idd_or_version=self._idd,
             check_length=False)
-        self.ddy_model = Epm.from_idf(
-            self._ddy_path,
-            idd_or_version=self._idd,
-            check_length=False)
-        self.weather_data = WeatherData.from_epw(self._weather_path)
+        # DDY model and weather data are only read (shared between Configs)
+        self.ddy_model = _load_read_only_epm(
+            self._ddy_path, os.path.getmtime(self._ddy_path), self._idd)
+        self.weather_data = _load_weather_data(
+            self._weather_path, os.path.getmtime(self._weather_path))
+        self._building_model_path = None
 
     # ---------------------------------------------------------------------------- #
     #                       IDF and Building model management                      #
     # ---------------------------------------------------------------------------- #
 
+    @property
+    def building(self):
+        """Building model. It may be modified by caller, so next save_building_model writes it again instead of copying last IDF saved.
+
+        Returns:
+            Epm: opyplus Epm object with IDF model.
+        """
+        self._building_model_path = None
+        return self._building
+
+    @building.setter
+    def building(self, building):
+        """Replace building model.
+
+        Args:
+            building (Epm): opyplus Epm object with IDF model.
+        """
+        self._building_model_path = None
+        self._building = building
+
     def adapt_idf_to_epw(self,
                          summerday: str = 'Ann Clg .4% Condns DB=>MWB',
                          winterday: str = 'Ann Htg 99.6% Condns DB'):
@@ -73,8 +144,8 @@ class Config(object):
             winterday (str): Design day for winter day specifically (DDY has several of them).
         """
 
-        old_location = self.building.site_location[0]
-        old_designdays = self.building.SizingPeriod_DesignDay
+        old_location = self._building.site_location[0]
+        old_designdays = self._building.SizingPeriod_DesignDay
 
         # Adding the new location and designdays based on ddy file
         # LOCATION
@@ -93,15 +164,19 @@ class Config(object):
         old_designdays.delete()
 
         # Added New Location and DesignDays to Epm
-        self.building.site_location.batch_add(new_location)
-        self.building.SizingPeriod_DesignDay.batch_add(new_designdays)
+        self._building.site_location.batch_add(new_location)
+        self._building.SizingPeriod_DesignDay.batch_add(new_designdays)
+        # Building model must be saved again
+        self._building_model_path = None
 
     def apply_extra_conf(self):
         """Set extra configuration in building model
         """
         if self.config is not None:
             if self.config.get('timesteps_per_hour'):
-                self.building.timestep[0].number_of_timesteps_per_hour = self.config['timesteps_per_hour']
+                self._building.timestep[0].number_of_timesteps_per_hour = self.config['timesteps_per_hour']
+            # Building model must be saved again
+            self._building_model_path = None
 
     def save_building_model(self):
         """Take current building model and save as IDF in current env_working_dir episode folder.
@@ -113,7 +188,14 @@ class Config(object):
         if self.episode_path is not None:
             episode_idf_path = self.episode_path + \
                 '/' + self._idf_path.split('/')[-1]
-            self.building.save(episode_idf_path)
+            # Building model is not modified between episodes, so last IDF
+            # saved is copied instead of serializing the model again
+            if self._building_model_path is not None and os.path.isfile(
+                    self._building_model_path):
+                copyfile(self._building_model_path, episode_idf_path)
+            else:
+                self._building.save(episode_idf_path)
+            self._building_model_path = episode_idf_path
             return episode_idf_path
         else:
             raise Exception
@@ -147,22 +229,12 @@ class Config(object):
             mu = variation[1]  # Mean.
             tau = variation[2]  # Time constant.
 
-            T = 1.  # Total time.
             # All the columns are going to have the same num of rows since they are
             # in the same dataframe
             n = len(df[columns[0]])
-            dt = T / n
-            # t = np.linspace(0., T, n)  # Vector of times.
-
-            sigma_bis = sigma * np.sqrt(2. / tau)
-            sqrtdt = np.sqrt(dt)
-
-            x = np.zeros(n)
 
             # Create noise
-            for i in range(n - 1):
-                x[i + 1] = x[i] + dt * (-(x[i] - mu) / tau) + \
-                    sigma_bis * sqrtdt * np.random.randn()
+            x = ornstein_uhlenbeck_process(n, sigma, mu, tau)
 
             for column in columns:
                 # Add noise
@@ -190,7 +262,7 @@ class Config(object):
             (int, int, int, int, int, int, int, int): A tuple with: the start month, start day, start year, end month, end day, end year, start weekday and number of steps in a hour simulation.
         """
         # Get runperiod object inner IDF
-        runperiod = self.building.RunPeriod[0]
+        runperiod = self._building.RunPeriod[0]
 
         start_month = int(
             0 if runperiod.begin_month is None else runperiod.begin_month)
@@ -205,7 +277,7 @@ class Config(object):
         end_year = int(0 if runperiod.end_year is None else runperiod.end_year)
         start_weekday = WEEKDAY_ENCODING[runperiod.day_of_week_for_start_day.lower(
         )]
-        n_steps_per_hour = self.building.timestep[0].number_of_timesteps_per_hour
+        n_steps_per_hour = self._building.timestep[0].number_of_timesteps_per_hour
         if n_steps_per_hour < 1 or n_steps_per_hour is None:
             n_steps_per_hour = 4  # default value
 
@@ -226,7 +298,7 @@ class Config(object):
             int: The simulation time step in which the simulation ends.
         """
         # Get runperiod object inner IDF
-        runperiod = self.building.RunPeriod[0]
+        runperiod = self._building.RunPeriod[0]
         start_month = int(
             0 if runperiod.begin_month is None else runperiod.begin_month)
         start_day = int(
@@ -54,6 +54,9 @@ class RuleBasedController(object):
         self.variables_path = self.env.variables_path
         self.variables = parse_variables(self.variables_path)
         self.variables['observation'].extend(['day', 'month', 'hour'])
+        # Observation index of the variable used by rules (resolved once)
+        self._out_temp_idx = self.variables['observation'].index(
+            'Site Outdoor Air Drybulb Temperature (Environment)')
 
         self.summer_start_date = datetime(year, 6, 1)
         self.summer_final_date = datetime(year, 9, 30)
@@ -67,8 +70,7 @@ class RuleBasedController(object):
         Returns:
             object: Action chosen.
         """
-        obs_dict = dict(zip(self.variables['observation'], observation))
-        out_temp = obs_dict['Site Outdoor Air Drybulb Temperature (Environment)']
+        out_temp = observation[self._out_temp_idx]
 
         if out_temp < 15:  # t < 15
             action = (19, 21)
@@ -3,10 +3,48 @@
 import numpy as np
 import gym
 
-from collections import deque
 from sinergym.utils.common import CSVLogger
 from sinergym.utils.common import RANGES_5ZONE
-from stable_baselines3.common.env_util import is_wrapped
+from stable_baselines3.common.env_util import unwrap_wrapper
+
+try:
+    from numba import njit
+except ImportError:
+    # Numba is optional (pip install sinergym[performance]), NumPy
+    # vectorized normalization is used otherwise
+    njit = None
+
+if njit is not None:
+    @njit(cache=True)
+    def _normalize(values, low, high, span, zero_span, out):
+        """Normalize observation values to range [0, 1] (compiled with Numba).
+
+        Args:
+            values (np.ndarray): Observation variables values.
+            low (np.ndarray): Minimum values of observation variables.
+            high (np.ndarray): Maximum values of observation variables.
+            span (np.ndarray): high - low (1 where it is 0).
+            zero_span (np.ndarray): Whether high == low for each variable.
+            out (np.ndarray): Array where normalized values are written.
+        """
+        for i in range(values.shape[0]):
+            value = values[i]
+            if zero_span[i]:
+                # Clipped instead of normalized (avoid DivisionbyZero)
+                if value < low[i]:
+                    value = low[i]
+                elif value > high[i]:
+                    value = high[i]
+            else:
+                value = (value - low[i]) / span[i]
+            # If value is out (nan is 0)
+            if value != value or value < 0.0:
+                value = 0.0
+            elif value > 1.0:
+                value = 1.0
+            out[i] = value
+else:
+    _normalize = None
 
 
 class NormalizeObservation(gym.ObservationWrapper):
@@ -20,7 +58,34 @@ class NormalizeObservation(gym.ObservationWrapper):
         """
         super(NormalizeObservation, self).__init__(env)
         self.unwrapped_observation = None
-        self.ranges = ranges
+        self._ranges = ranges
+
+        # Observation variables normalized (order of observation values)
+        self._var_names = list(env.variables['observation'])
+        # Ranges as arrays in observation variables order
+        self._low = np.array([ranges[variable][0]
+                              for variable in self._var_names], dtype=np.float32)
+        self._high = np.array([ranges[variable][1]
+                               for variable in self._var_names], dtype=np.float32)
+        # Variables with the same min and max are clipped instead of
+        # normalized (avoid DivisionbyZero)
+        self._zero_span = (self._high - self._low) == 0
+        self._any_zero_span = bool(self._zero_span.any())
+        self._span = np.where(self._zero_span, 1, self._high - self._low)
+        self._n_variables = len(self._var_names)
+        if _normalize is not None:
+            # Compile Numba kernel now instead of in first step
+            _normalize(self._low, self._low, self._high, self._span,
+                       self._zero_span, np.empty_like(self._low))
+
+    @property
+    def ranges(self):
+        """Observation variables ranges used in normalization (read-only, normalization uses its arrays built at construction).
+
+        Returns:
+            dict: Ranges (min, max) by observation variable.
+        """
+        return self._ranges
 
     def observation(self, obs):
         """Applies normalization to observation.
@@ -29,38 +94,40 @@ class NormalizeObservation(gym.ObservationWrapper):
             obs (object): Original observation.
 
         Returns:
-            object: Normalized observation.
+            np.ndarray: Normalized observation (float32 dtype, like observation space).
         """
-        # Save original obs in class attribute
-        self.unwrapped_observation = obs.copy()
+        src = np.asarray(obs, dtype=np.float32)
+        # Save original obs in class attribute (src is not modified)
+        self.unwrapped_observation = src
 
         # NOTE: If you want to record day, month and hour, you should add that
-        # variables as keys
-        for i, variable in enumerate(self.env.variables['observation']):
-            # normalization (handle DivisionbyZero Error)
-            if(self.ranges[variable][1] - self.ranges[variable][0] == 0):
-                obs[i] = max(
-                    self.ranges[variable][0], min(
-                        obs[i], self.ranges[variable][1]))
-            else:
-                obs[i] = (obs[i] - self.ranges[variable][0]) / \
-                    (self.ranges[variable][1] - self.ranges[variable][0])
-
+        # variables as keys (only observation variables are normalized)
+        n = self._n_variables
+        values = src[:n]
+        out = np.empty_like(src)
+        normalized = out[:n]
+        if _normalize is not None:
+            _normalize(values, self._low, self._high, self._span,
+                       self._zero_span, normalized)
+        else:
+            np.subtract(values, self._low, out=normalized)
+            np.divide(normalized, self._span, out=normalized)
+            if self._any_zero_span:
+                np.clip(values, self._low, self._high,
+                        out=normalized, where=self._zero_span)
             # If value is out
-            if np.isnan(obs[i]):
-                obs[i] = 0
-            elif obs[i] > 1:
-                obs[i] = 1
-            elif obs[i] < 0:
-                obs[i] = 0
+            np.nan_to_num(normalized, copy=False)
+            np.clip(normalized, 0.0, 1.0, out=normalized)
+
         # Return obs values in the SAME ORDER than obs argument.
-        return np.array(obs)
+        out[n:] = src[n:]
+        return out
 
     def get_unwrapped_obs(self):
         """Get last environment observation without normalization.
 
         Returns:
-            object: Last original observation.
+            np.ndarray: Last original observation (float32 dtype).
         """
         return self.unwrapped_observation
 
@@ -78,9 +145,14 @@ class MultiObsWrapper(gym.Wrapper):
         super(MultiObsWrapper, self).__init__(env)
         self.n = n
         self.ind_flat = flatten
-        self.history = deque([], maxlen=n)
         shape = env.observation_space.shape
+        # Preallocated ring buffer with the last n observations (self._head
+        # points to the oldest one)
+        self._buf = np.zeros((n,) + shape, dtype=np.float32)
+        self._head = 0
         new_shape = (shape[0] * n,) if flatten else ((n,) + shape)
+        # flatten is fixed, so observation getter is chosen only once
+        self._get_obs = self._get_obs_flat if flatten else self._get_obs_stack
         self.observation_space = gym.spaces.Box(
             low=-5e6, high=5e6, shape=new_shape, dtype=np.float32)
 
@@ -91,27 +163,50 @@ class MultiObsWrapper(gym.Wrapper):
             list: Stacked previous observations.
         """
         obs = self.env.reset()
-        for _ in range(self.n):
-            self.history.append(obs)
+        self._buf[:] = obs
+        self._head = 0
         return self._get_obs()
 
     def step(self, action):
         """Performs the action in the new environment."""
 
         observation, reward, done, info = self.env.step(action)
-        self.history.append(observation)
+        # Newest observation replaces the oldest one
+        self._buf[self._head] = observation
+        self._head = (self._head + 1) % self.n
         return self._get_obs(), reward, done, info
 
-    def _get_obs(self):
-        """Get observation history.
+    def _get_obs_flat(self):
+        """Get observation history as a flat vector.
 
         Returns:
-            np.array: Array of previous observations.
+            np.array: Previous observations concatenated (oldest first).
         """
-        if self.ind_flat:
-            return np.array(self.history).reshape(-1,)
-        else:
-            return np.array(self.history)
+        # Rows gathered in a new array (buffer is overwritten in next steps)
+        return np.concatenate(
+            (self._buf[self._head:], self._buf[:self._head])).reshape(-1,)
+
+    def _get_obs_stack(self):
+        """Get observation history as a stack.
+
+        Returns:
+            np.array: Array of previous observations (oldest first).
+        """
+        # Rows gathered in a new array (buffer is overwritten in next steps)
+        return np.concatenate(
+            (self._buf[self._head:], self._buf[:self._head]))
+
+
+def _date(info):
+    """Simulation date of a step.
+
+    Args:
+        info (dict): Step information.
+
+    Returns:
+        tuple: Current date (month,day,hour) in simulation.
+    """
+    return (info['month'], info['day'], info['hour'])
 
 
 class LoggerWrapper(gym.Wrapper):
@@ -124,14 +219,15 @@ class LoggerWrapper(gym.Wrapper):
             flag (bool, optional): State of logger (activate or deactivate).
         """
         gym.Wrapper.__init__(self, env)
+        # Wrapper stack is fixed after construction, check it only once
+        self.refresh_wrappers()
         # Headers for csv logger
         monitor_header_list = ['timestep,month,day,hour'] + env.variables['observation'] + \
             env.variables['action'] + ['time (seconds)', 'reward',
                                        'power_penalty', 'comfort_penalty', 'done']
-        self.monitor_header = ''
-        for element_header in monitor_header_list:
-            self.monitor_header += element_header + ','
-        self.monitor_header = self.monitor_header[:-1]
+        self.monitor_header = ','.join(monitor_header_list)
+        # Action recorded in initial state of each episode
+        self._none_action = [None] * len(env.variables['action'])
         self.progress_header = 'episode_num,cumulative_reward,mean_reward,cumulative_power_consumption,mean_power_consumption,cumulative_comfort_penalty,mean_comfort_penalty,cumulative_power_penalty,mean_power_penalty,comfort_violation (%),length(timesteps),time_elapsed(seconds)'
 
         # Create simulation logger, by default is active (flag=True)
@@ -152,49 +248,45 @@ class LoggerWrapper(gym.Wrapper):
             (np.array(),float,bool,dict) tuple
         """
         obs, reward, done, info = self.env.step(action)
-        # We added some extra values (month,day,hour) manually in env, so we
-        # need to delete them.
-        if is_wrapped(self, NormalizeObservation):
-            # Record action and new observation in simulator's csv
-            self.logger.log_step_normalize(timestep=info['timestep'],
-                                           date=[info['month'],
-                                                 info['day'], info['hour']],
-                                           observation=obs[:-3],
-                                           action=info['action_'],
-                                           simulation_time=info['time_elapsed'],
-                                           reward=reward,
-                                           total_power_no_units=info['total_power_no_units'],
-                                           comfort_penalty=info['comfort_penalty'],
-                                           done=done)
-            # Record original observation too
-            self.logger.log_step(
-                timestep=info['timestep'],
-                date=[
-                    info['month'],
-                    info['day'],
-                    info['hour']],
-                observation=self.env.get_unwrapped_obs()[
-                    :-3],
-                action=info['action_'],
-                simulation_time=info['time_elapsed'],
-                reward=reward,
-                total_power_no_units=info['total_power_no_units'],
-                comfort_penalty=info['comfort_penalty'],
-                power=info['total_power'],
-                done=done)
-        else:
-            # Only record observation without normalization
-            self.logger.log_step(timestep=info['timestep'],
-                                 date=[info['month'],
-                                       info['day'], info['hour']],
-                                 observation=obs[:-3],
-                                 action=info['action_'],
-                                 simulation_time=info['time_elapsed'],
-                                 reward=reward,
-                                 total_power_no_units=info['total_power_no_units'],
-                                 comfort_penalty=info['comfort_penalty'],
-                                 power=info['total_power'],
-                                 done=done)
+        # Nothing to record if logger is deactivated
+        if self.logger.flag:
+            # Step information is read only once
+            timestep = info['timestep']
+            date = _date(info)
+            action_ = info['action_']
+            time_elapsed = info['time_elapsed']
+            total_power_no_units = info['total_power_no_units']
+            comfort_penalty = info['comfort_penalty']
+            total_power = info['total_power']
+            # We added some extra values (month,day,hour) manually in env, so we
+            # need to delete them.
+            if self._has_norm:
+                # Record action, new observation and original observation in
+                # simulator's csv files
+                unwrapped_obs = self._norm_wrapper.unwrapped_observation
+                self.logger.log_step_pair(timestep=timestep,
+                                          date=date,
+                                          observation=unwrapped_obs[:-3],
+                                          normalized_observation=obs[:-3],
+                                          action=action_,
+                                          simulation_time=time_elapsed,
+                                          reward=reward,
+                                          total_power_no_units=total_power_no_units,
+                                          comfort_penalty=comfort_penalty,
+                                          power=total_power,
+                                          done=done)
+            else:
+                # Only record observation without normalization
+                self.logger.log_step(timestep=timestep,
+                                     date=date,
+                                     observation=obs[:-3],
+                                     action=action_,
+                                     simulation_time=time_elapsed,
+                                     reward=reward,
+                                     total_power_no_units=total_power_no_units,
+                                     comfort_penalty=comfort_penalty,
+                                     power=total_power,
+                                     done=done)
 
         return obs, reward, done, info
 
@@ -218,10 +310,9 @@ class LoggerWrapper(gym.Wrapper):
             self.env.simulator._eplus_working_dir + '/monitor.csv')
         # Store initial state of simulation
         self.logger.log_step(timestep=0,
-                             date=[obs[-2], obs[-3], obs[-1]],
+                             date=(obs[-2], obs[-3], obs[-1]),
                              observation=obs[:-3],
-                             action=[None for _ in range(
-                                 len(self.env.variables['action']))],
+                             action=self._none_action,
                              simulation_time=0,
                              reward=None,
                              total_power_no_units=None,
@@ -238,10 +329,19 @@ class LoggerWrapper(gym.Wrapper):
         self.env.simulator.logger_main.debug(
             'End of episode, recording summary (progress.csv) if logger is active')
         self.logger.log_episode(episode=self.env.simulator._epi_num)
+        # Monitor files must be closed although logger is deactivated
+        self.logger.close()
 
         # Then, close env
         self.env.close()
 
+    def refresh_wrappers(self):
+        """Check again wrappers under this one (call it if environment wrappers are modified).
+        """
+        # NormalizeObservation instance (if any) to get original observations
+        self._norm_wrapper = unwrap_wrapper(self, NormalizeObservation)
+        self._has_norm = self._norm_wrapper is not None
+
     def activate_logger(self):
         """Activate logger if its flag False.
         """
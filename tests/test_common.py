@@ -2,6 +2,9 @@ import pytest
 import sinergym.utils.common as common
 from opyplus import Epm, WeatherData
 import shutil
+import gc
+import os
+import numpy as np
 
 
 @pytest.mark.parametrize(
@@ -101,6 +104,33 @@ def test_parse_observation_action_space(space_path):
                ) == output['continuous_action'][2][0]
 
 
+@pytest.mark.parametrize(
+    'sigma,mu,tau',
+    [
+        (1, 0.0, 0.001),
+        (5, 0.0, 0.01),
+        (10, 0.0, 0.1),
+        (1, 0.0, 0.0001),
+    ]
+)
+def test_ornstein_uhlenbeck_process(sigma, mu, tau):
+    n = 8760
+    np.random.seed(0)
+    output = common.ornstein_uhlenbeck_process(n, sigma, mu, tau)
+    assert output.shape == (n,)
+    assert output[0] == 0
+
+    # Same series than step by step Euler-Maruyama process
+    dt = 1. / n
+    sigma_bis = sigma * np.sqrt(2. / tau)
+    np.random.seed(0)
+    expected = np.zeros(n)
+    for i in range(n - 1):
+        expected[i + 1] = expected[i] + dt * (-(expected[i] - mu) / tau) + \
+            sigma_bis * np.sqrt(dt) * np.random.randn()
+    assert np.allclose(output, expected)
+
+
 @pytest.mark.parametrize(
     'variation',
     [
@@ -119,3 +149,72 @@ def test_create_variable_weather(variation, weather_data, weather_path):
         expected = weather_path.split('.epw')[0] + '_Random_' + str(
             variation[0]) + '_' + str(variation[1]) + '_' + str(variation[2]) + '.epw'
         assert output == expected
+
+
+class _FailingFile(object):
+    """File object whose writes fail (like a full disk)."""
+
+    def write(self, data):
+        raise OSError(28, 'No space left on device')
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _csv_logger(tmp_path):
+    header = 'timestep,month,day,hour,obs,act,time (seconds),reward,' + \
+        'power_penalty,comfort_penalty,done'
+    progress_file = os.path.join(str(tmp_path), 'progress.csv')
+    return common.CSVLogger(monitor_header=header,
+                            progress_header='episode_num',
+                            log_progress_file=progress_file)
+
+
+def test_csv_logger_writer_error(tmp_path):
+    logger = _csv_logger(tmp_path)
+    logger.set_log_file(str(tmp_path / 'monitor.csv'))
+    monitor_file = logger._monitor_file
+    logger._monitor_file = _FailingFile()
+
+    # More rows than writer queue size, main thread must not block
+    with pytest.raises(OSError):
+        for i in range(2 * common.CSVLogger.QUEUE_SIZE):
+            logger.log_step(timestep=i,
+                            date=(1, 1, 0),
+                            observation=[21.0],
+                            action=[22.0],
+                            simulation_time=i * 900,
+                            reward=-1.0,
+                            total_power_no_units=-1.0,
+                            comfort_penalty=0.0,
+                            power=100.0,
+                            done=False)
+        logger.close()
+    # Error is only raised once, so logger can be closed after it
+    logger.close()
+    assert logger._writer is None
+    monitor_file.close()
+
+
+def test_csv_logger_writer_thread(tmp_path):
+    logger = _csv_logger(tmp_path)
+    writer = logger._writer
+    assert writer.is_alive()
+    # Same writer thread for every episode
+    for episode in range(3):
+        logger.set_log_file(
+            os.path.join(str(tmp_path), 'monitor_%d.csv' % episode))
+        assert logger._writer is writer
+    logger.close()
+    assert not writer.is_alive()
+
+    # Writer thread is stopped if logger is not closed
+    logger = _csv_logger(tmp_path)
+    writer = logger._writer
+    del logger
+    gc.collect()
+    writer.join(timeout=5)
+    assert not writer.is_alive()
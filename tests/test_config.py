@@ -102,6 +102,27 @@ def test_save_building_model(config, eplus_path, idf_path):
     building = Epm.from_idf(idf_path, idd_or_version=idd)
     assert (building.get_info() is not None) or (building.get_info() != '')
 
+    # Next episode reuses the IDF saved (building model has not changed)
+    config.set_episode_working_dir()
+    path_save_2 = config.save_building_model()
+    assert path_save_2 != path_save
+    with open(path_save, 'r') as idf_1, open(path_save_2, 'r') as idf_2:
+        assert idf_1.read() == idf_2.read()
+
+    # Building model modified by extra configuration is saved again
+    config.apply_extra_conf()
+    config.set_episode_working_dir()
+    path_save_3 = config.save_building_model()
+    building = Epm.from_idf(path_save_3, idd_or_version=idd)
+    assert int(building.timestep[0].number_of_timesteps_per_hour) == 2
+
+    # Building model modified from outside is saved again too
+    config.building.timestep[0].number_of_timesteps_per_hour = 6
+    config.set_episode_working_dir()
+    path_save_4 = config.save_building_model()
+    building = Epm.from_idf(path_save_4, idd_or_version=idd)
+    assert int(building.timestep[0].number_of_timesteps_per_hour) == 6
+
 
 def test_apply_weather_variability(config):
     # First set a epìsode dir in experiment
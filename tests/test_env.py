@@ -1,6 +1,8 @@
 from random import randint
 import gym
 import os
+import pytest
+from sinergym.envs import make_vec
 from stable_baselines3.common.env_checker import check_env
 
 
@@ -80,3 +82,20 @@ def test_all_environments():
         # Rename directory with name TEST for future remove
         os.rename(env.simulator._env_working_dir_parent, 'Eplus-env-TEST' +
                   env.simulator._env_working_dir_parent.split('/')[-1])
+
+
+def test_make_vec():
+    with pytest.raises(ValueError):
+        make_vec('Eplus-demo-v1', 2, weather_files=[
+                 'USA_PA_Pittsburgh-Allegheny.County.AP.725205_TMY3.epw'])
+
+    # TEST name, so workers directories are removed at the end of tests
+    env = make_vec('Eplus-demo-v1', 2, env_name='TESTVEC')
+    obs = env.reset()
+    assert obs.shape == (2, 19)
+    obs, rewards, dones, infos = env.step(env.action_space.sample())
+    assert obs.shape == (2, 19)
+    assert len(rewards) == 2
+    assert not any(dones)
+    assert all(info['timestep'] == 1 for info in infos)
+    env.close()
@@ -5,6 +5,7 @@ import subprocess
 import threading
 import pkg_resources
 import signal
+import numpy as np
 
 import os
 
@@ -20,7 +21,7 @@ def test_reset(simulator):
     assert len(output[0]) == 4
     # Last element in first tuple must be time_elapsed 0
     assert output[0][-1] == 0
-    assert isinstance(output[1], list)
+    assert isinstance(output[1], np.ndarray)
     assert len(output[1]) == 16
     assert output[2] == False
 
@@ -38,7 +39,7 @@ def test_reset(simulator):
 
     # Checking energyplus subprocess
     assert isinstance(simulator._eplus_process, subprocess.Popen)
-    assert '/usr/local/EnergyPlus' in simulator._eplus_process.args
+    assert '/usr/local/EnergyPlus' in simulator._eplus_process.args[0]
 
     # Checking next directory for the next simulation episode is created
     # successfully
@@ -59,7 +60,7 @@ def test_step(simulator):
     # Last element in first tuple must be time_elapsed > 0 (since we have a
     # step executed)
     assert output[0][-1] > 0
-    assert isinstance(output[1], list)
+    assert isinstance(output[1], np.ndarray)
     assert len(output[1]) == 16
 
     # Check simulation advance with step
@@ -67,7 +68,7 @@ def test_step(simulator):
     # Simulation time elapsed at each timestep is defined in the simulator
     assert simulator._curSimTim == simulator._eplus_run_stepsize
     assert simulator._curSimTim == output[0][-1]
-    assert isinstance(output[1], list)
+    assert isinstance(output[1], np.ndarray)
     assert len(output[1]) == 16
     assert (simulator._curSimTim >= simulator._eplus_one_epi_len) == output[2]
 
@@ -138,7 +139,9 @@ def test_create_eplus(simulator, eplus_path, weather_path, idf_path):
     out_path = eplus_working_dir + '/output'
     eplus_process = simulator._create_eplus(
         eplus_path, weather_path, idf_path, out_path, eplus_working_dir)
-    assert 'ERROR' not in str(eplus_process.stdout.read())
+    eplus_process.wait()
+    with open(eplus_working_dir + '/eplus.stdout', 'rb') as stdout_file:
+        assert 'ERROR' not in str(stdout_file.read())
 
 
 def test_get_is_eplus_running(simulator):
@@ -180,7 +183,7 @@ def test_assembleMsg(simulator):
     Dblist = [num for num in range(16)]
     msg = simulator._assembleMsg(
         header, 0, len(action), 0, 0, curSimTim, Dblist)
-    assert msg == '0 0 2 0 0 0.000000000000000e+00 0.000000000000000e+00 1.000000000000000e+00 2.000000000000000e+00 3.000000000000000e+00 4.000000000000000e+00 5.000000000000000e+00 6.000000000000000e+00 7.000000000000000e+00 8.000000000000000e+00 9.000000000000000e+00 1.000000000000000e+01 1.100000000000000e+01 1.200000000000000e+01 1.300000000000000e+01 1.400000000000000e+01 1.500000000000000e+01 \n'
+    assert msg == b'0 0 2 0 0 0.000000000000000e+00 0.000000000000000e+00 1.000000000000000e+00 2.000000000000000e+00 3.000000000000000e+00 4.000000000000000e+00 5.000000000000000e+00 6.000000000000000e+00 7.000000000000000e+00 8.000000000000000e+00 9.000000000000000e+00 1.000000000000000e+01 1.100000000000000e+01 1.200000000000000e+01 1.300000000000000e+01 1.400000000000000e+01 1.500000000000000e+01 \n'
 
 
 def test_disassembleMsg(simulator):
@@ -193,4 +196,5 @@ def test_disassembleMsg(simulator):
     assert nIn == 0
     assert nBl == 0
     assert curSimTim == 0
-    assert [num for num in range(16)] == Dblist
+    assert isinstance(Dblist, np.ndarray)
+    assert [num for num in range(16)] == Dblist.tolist()
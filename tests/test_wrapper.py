@@ -1,6 +1,8 @@
 from sinergym.utils.wrappers import NormalizeObservation
+import sinergym.utils.wrappers as wrappers
 import pytest
 import numpy as np
+import gym
 import os
 import csv
 from stable_baselines3.common.env_util import is_wrapped
@@ -20,8 +22,10 @@ def test_logger_wrapper(env_name, request):
     tmp_log_file = logger.log_file
 
     # simulating short episode
+    steps = []
     for _ in range(10):
-        env.step(env.action_space.sample())
+        _, reward, done, info = env.step(env.action_space.sample())
+        steps.append((reward, done, info))
     env.reset()
 
     assert os.path.isfile(logger.log_progress_file)
@@ -52,12 +56,50 @@ def test_logger_wrapper(env_name, request):
                 assert ','.join(row) == logger.monitor_header
                 break
 
+    # Check rows
+    n_obs = len(env.variables['observation'])
+    n_act = len(env.variables['action'])
+    with open(tmp_log_file, mode='r', newline='') as csvfile:
+        rows = list(csv.reader(csvfile, delimiter=','))[1:]
+    # Initial state row and one row per step
+    assert len(rows) == 11
+    for row in rows:
+        assert len(row) == len(logger.monitor_header.split(','))
+    # None fields (action, reward, penalties) of initial state are empty
+    assert rows[0][0] == '0'
+    assert rows[0][4 + n_obs:4 + n_obs + n_act] == [''] * n_act
+    assert rows[0][-5:] == ['0', '', '', '', 'False']
+    for row, (reward, done, info) in zip(rows[1:], steps):
+        assert int(row[0]) == info['timestep']
+        assert [float(value) for value in row[1:4]] == [
+            info['month'], info['day'], info['hour']]
+        assert [float(value) for value in row[4 + n_obs:4 + n_obs + n_act]
+                ] == pytest.approx(info['action_'])
+        assert int(row[-5]) == info['time_elapsed']
+        assert float(row[-4]) == pytest.approx(reward)
+        assert float(row[-3]) == pytest.approx(info['total_power_no_units'])
+        assert float(row[-2]) == pytest.approx(info['comfort_penalty'])
+        assert row[-1] == str(done)
+    if is_wrapped(env, NormalizeObservation):
+        with open(tmp_log_file[:-4] + '_normalized.csv', mode='r', newline='') as csvfile:
+            normalized_rows = list(csv.reader(csvfile, delimiter=','))[1:]
+        # Only steps are recorded (not initial state)
+        assert len(normalized_rows) == 10
+        for row, data_row in zip(normalized_rows, rows[1:]):
+            assert row[:4] == data_row[:4]
+            assert row[4 + n_obs:] == data_row[4 + n_obs:]
+            assert all(0 <= float(value) <= 1
+                       for value in row[4:4 + n_obs])
+    # Rows end with '\n' (not csv module '\r\n')
+    with open(tmp_log_file, mode='rb') as monitor_file:
+        assert b'\r' not in monitor_file.read()
+
     env.close()
 
 
 def test_env_wrappers(env_all_wrappers):
-    # env_wrapper history should be empty at the beginning
-    assert len(env_all_wrappers.history) == 0
+    # env_wrapper history buffer should be empty at the beginning
+    assert not env_all_wrappers._buf.any()
     for i in range(1):  # Only need 1 episode
         obs = env_all_wrappers.reset()
         # This obs should be normalize --> [-1,1]
@@ -69,6 +111,80 @@ def test_env_wrappers(env_all_wrappers):
             obs, reward, done, info = env_all_wrappers.step(a)
 
     # Let's check if history has been completed succesfully
-    assert len(env_all_wrappers.history) == 5
-    assert isinstance(env_all_wrappers.history[0], np.ndarray)
+    assert env_all_wrappers._buf.shape == (
+        5, env_all_wrappers.env.observation_space.shape[0])
+    assert obs.shape == (5 * env_all_wrappers._buf.shape[1],)
+    env_all_wrappers.close()
+
+
+def test_multiobs_wrapper_returned_obs(env_all_wrappers):
+    obs = env_all_wrappers.reset()
+    obs_copy = obs.copy()
+    next_obs, _, _, _ = env_all_wrappers.step(
+        env_all_wrappers.action_space.sample())
+    # Observations returned previously must not be modified by next steps
+    assert (obs == obs_copy).all()
+    assert not np.shares_memory(obs, next_obs)
+    # Stack is shifted one observation (newest at the end)
+    obs_dim = obs.shape[0] // 5
+    assert (next_obs[:-obs_dim] == obs[obs_dim:]).all()
     env_all_wrappers.close()
+
+
+class _ObservationEnv(gym.Env):
+    """Environment with observation variables only (no simulation)."""
+
+    def __init__(self, variables):
+        self.variables = {'observation': variables, 'action': []}
+        self.observation_space = gym.spaces.Box(
+            low=-5e6, high=5e6, shape=(len(variables) + 3,), dtype=np.float32)
+        self.action_space = gym.spaces.Box(
+            low=0, high=1, shape=(1,), dtype=np.float32)
+
+
+def _reference_normalization(obs, variables, ranges):
+    # Element by element normalization (original implementation)
+    obs = list(obs)
+    for i, variable in enumerate(variables):
+        if ranges[variable][1] - ranges[variable][0] == 0:
+            obs[i] = max(ranges[variable][0], min(obs[i], ranges[variable][1]))
+        else:
+            obs[i] = (obs[i] - ranges[variable][0]) / \
+                (ranges[variable][1] - ranges[variable][0])
+        if np.isnan(obs[i]):
+            obs[i] = 0
+        elif obs[i] > 1:
+            obs[i] = 1
+        elif obs[i] < 0:
+            obs[i] = 0
+    return np.array(obs)
+
+
+@pytest.mark.parametrize('use_numba', [(False), (True), ])
+def test_normalize_observation_values(use_numba, monkeypatch):
+    if not use_numba:
+        monkeypatch.setattr(wrappers, '_normalize', None)
+    elif wrappers._normalize is None:
+        pytest.skip('numba is not installed')
+    variables = ['a', 'b', 'c', 'd']
+    # c and d have the same min and max (clipped instead of normalized)
+    ranges = {'a': [0.0, 10.0], 'b': [-5.0, 5.0],
+              'c': [0.5, 0.5], 'd': [3.0, 3.0]}
+    env = NormalizeObservation(_ObservationEnv(variables), ranges=ranges)
+    observations = [
+        [5.0, 0.0, 0.2, 1.0, 12, 6, 23],
+        [-1.0, 7.5, 0.9, 5.0, 1, 1, 0],
+        [np.nan, np.inf, -2.0, 3.0, 31, 12, 1],
+        [20.0, -np.inf, 0.5, -7.0, 28, 2, 12],
+    ]
+    for obs in observations:
+        original = np.array(obs, dtype=np.float32)
+        normalized = env.observation(original)
+        assert normalized.dtype == np.float32
+        assert np.allclose(
+            normalized[:-3], _reference_normalization(obs[:-3], variables, ranges))
+        # day, month and hour are not normalized
+        assert (normalized[-3:] == original[-3:]).all()
+        # original observation is kept unchanged
+        assert np.array_equal(
+            env.get_unwrapped_obs(), original, equal_nan=True)